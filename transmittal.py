@@ -1,60 +1,204 @@
 
 import streamlit as st
 import pandas as pd
-from io import StringIO
+import numpy as np
+from io import BytesIO
+import hashlib
+import os
 import re
-import matplotlib.pyplot as plt
-import seaborn as sns
+import tempfile
+from functools import lru_cache
+import xlsxwriter
+import plotly.express as px
 
-def update_excel(df, codes, date, transmittal, date_col, transmittal_col, code_col):
+_CODE_SPLIT_RE = re.compile(r'[\n,]')
+
+# The cached loaders below take the raw bytes as _file_bytes, which
+# the Streamlit caches leave out of their key, and are keyed on file_key so
+# the upload is hashed once per rerun rather than once per cached call.
+# These caches are shared by every session of the server process, and each
+# entry of the full-read caches is a whole parsed workbook (or its code index)
+# for one upload and code column. Entries expire an hour after they are built
+# to bound memory, and max_entries is large enough that several users switching
+# uploads or code columns do not keep evicting each other.
+_CACHE_TTL = "1h"
+_CACHE_MAX_ENTRIES = 16
+
+def file_cache_key(file_bytes):
     """
-    Update the dataframe with the provided information
+    Return a short digest of the uploaded file to key the caches with
     """
-    updated_rows = 0
-    
-    for code in codes:
-        # Find rows where the code matches (case insensitive, strip whitespace)
-        mask = df[code_col].astype(str).str.strip().str.lower() == code.strip().lower()
-        matching_rows = df[mask]
-        
-        if not matching_rows.empty:
-            # Format date as DD-MMM-YY
-            formatted_date = date.strftime("%d-%b-%y")
-            df.loc[mask, date_col] = formatted_date
-            df.loc[mask, transmittal_col] = transmittal
-            updated_rows += len(matching_rows)
-    
-    return df, updated_rows
-
-def plot_status_charts(df, date_col, transmittal_col, updated_rows):
-    """
-    Generate visualization charts for document status
-    """
-    # Pie chart for updated vs non-updated rows
-    plt.figure(figsize=(6, 6))
-    updated_count = updated_rows
-    non_updated_count = len(df) - updated_rows
-    plt.pie(
-        [updated_count, non_updated_count],
-        labels=['Updated Rows', 'Non-Updated Rows'],
-        autopct='%1.1f%%',
-        colors=['#66b3ff', '#ff9999']
-    )
-    plt.title('Document Update Status')
-    plt.savefig('status_pie_chart.png')
-    plt.close()
-    
-    # Bar chart for updates by date
-    plt.figure(figsize=(8, 6))
-    date_counts = df[date_col].value_counts().sort_index()
-    sns.barplot(x=date_counts.index, y=date_counts.values, color='#66b3ff')
-    plt.title('Number of Updates by Date')
-    plt.xlabel('Date')
-    plt.ylabel('Number of Documents')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig('date_bar_chart.png')
-    plt.close()
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+@st.cache_data(max_entries=_CACHE_MAX_ENTRIES, ttl=_CACHE_TTL)
+def preview_workbook(file_key, _file_bytes, nrows=5):
+    """
+    Parse only the first rows of the uploaded Excel file, enough to list the
+    columns and show a preview before the full read
+    """
+    return pd.read_excel(BytesIO(_file_bytes), engine="calamine", nrows=nrows)
+
+@st.cache_data(max_entries=_CACHE_MAX_ENTRIES, ttl=_CACHE_TTL)
+def load_workbook(file_key, _file_bytes, code_col):
+    """
+    Parse the uploaded Excel file, cached on its key across reruns
+
+    The code column is read as strings up front so pandas does not infer a
+    type for it and codes such as "00123" stay as written.
+    """
+    return pd.read_excel(BytesIO(_file_bytes), engine="calamine", dtype={code_col: "string"})
+
+@st.cache_data(max_entries=_CACHE_MAX_ENTRIES, ttl=_CACHE_TTL)
+def normalized_codes(file_key, _file_bytes, code_col):
+    """
+    Return the code column lowercased and stripped, cached across reruns
+    """
+    df = load_workbook(file_key, _file_bytes, code_col)
+    # A plain comprehension avoids the intermediate Series built by each
+    # step of the .str accessor chain
+    arr = df[code_col].to_numpy(dtype=object, na_value="")
+    norm = np.fromiter((s.strip().lower() for s in arr), dtype=object, count=len(arr))
+    # Stored as a categorical so each row is a small integer code into the
+    # distinct values, which keeps the cached copy small and lets code_index
+    # group on integers instead of strings
+    return pd.Series(norm, index=df.index, dtype="category")
+
+# cache_resource rather than cache_data: document codes are usually unique
+# per row, so the index holds one entry per row, and cache_data would unpickle
+# a fresh copy of it on every rerun. update_excel only reads it.
+@st.cache_resource(max_entries=_CACHE_MAX_ENTRIES, ttl=_CACHE_TTL)
+def code_index(file_key, _file_bytes, code_col):
+    """
+    Map each normalized code to the row positions holding it, cached across
+    reruns so repeated updates only need one lookup per code
+    """
+    norm = normalized_codes(file_key, _file_bytes, code_col)
+    # Sort the row positions by category code and split them into one run
+    # per code, which is much cheaper than groupby().indices
+    codes = norm.cat.codes.to_numpy()
+    if not len(codes):
+        return {}
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.diff(codes[order])) + 1
+    keys = norm.cat.categories[codes[order[np.r_[0, starts]]]]
+    return dict(zip(keys, np.split(order, starts)))
+
+@lru_cache(maxsize=64)
+def _format_date(date):
+    """
+    Format a date as DD-MMM-YY
+    """
+    return date.strftime("%d-%b-%y")
+
+def date_counts(col):
+    """
+    Count the rows per date in the date column, in date order
+    """
+    # An updated date column mixes the new "%d-%b-%y" strings with the dates
+    # already in the file; parsing the strings puts both on one datetime
+    # scale (the existing Timestamps pass through), and anything that is not
+    # a date drops out as NaT
+    dates = pd.to_datetime(col, format="%d-%b-%y", errors="coerce")
+    counts = dates.value_counts().sort_index()
+    counts.index = counts.index.strftime("%d-%b-%y")
+    return counts
+
+def _write_rows(df, rows, values):
+    """
+    Set each column in values to its value at the given row positions by
+    writing the column arrays directly
+    """
+    # An object array takes the new strings whatever the column held before
+    # (empty columns read as float, date columns as datetime64), and
+    # isetitem swaps it in without going through .loc alignment
+    for col, value in values.items():
+        pos = df.columns.get_loc(col)
+        arr = df.iloc[:, pos].to_numpy(dtype=object, copy=True)
+        arr[rows] = value
+        df.isetitem(pos, arr)
+
+def update_excel(df, codes, date, transmittal, date_col, transmittal_col, code_idx):
+    """
+    Update the dataframe in place with the provided information
+
+    code_idx is the code to row positions mapping returned by code_index().
+    Also returns the positions of the updated rows.
+    """
+    # Look up every distinct code (case insensitive, strip whitespace)
+    code_set = {code.strip().lower() for code in codes}
+    matches = [code_idx[code] for code in code_set if code in code_idx]
+    rows = np.concatenate(matches) if matches else np.empty(0, dtype=np.int64)
+    if rows.size == 0:
+        # Nothing matched; leave the target columns and their dtypes alone
+        return df, 0, rows
+
+    formatted_date = _format_date(date)
+    # A dict so that picking the same column for both keeps the transmittal
+    _write_rows(df, rows, {date_col: formatted_date, transmittal_col: transmittal})
+    updated_rows = len(rows)
+
+    return df, updated_rows, rows
+
+def write_xlsx(df, output):
+    """
+    Write the dataframe to an xlsx file in xlsxwriter's constant-memory mode
+    """
+    # constant_memory flushes each row once the next one starts, so cells must
+    # be written row by row; pandas' to_excel writes column by column and
+    # would silently drop data in this mode
+    values = df.to_numpy(dtype=object)
+    values[pd.isna(values)] = None
+    # xlsxwriter cannot write infinite floats; write them as text, the way
+    # to_excel's default inf_rep does
+    values[values == np.inf] = "inf"
+    values[values == -np.inf] = "-inf"
+
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'default_date_format': 'dd-mmm-yy',
+    })
+    worksheet = workbook.add_worksheet()
+    header_format = workbook.add_format({'bold': True})
+    worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+    for row_idx, row in enumerate(values, start=1):
+        worksheet.write_row(row_idx, 0, row)
+    workbook.close()
+
+def write_csv(df, output):
+    """
+    Write the dataframe to a CSV file
+    """
+    df.to_csv(output, index=False, date_format="%d-%b-%y")
+
+def write_parquet(df, output):
+    """
+    Write the dataframe to a zstd-compressed Parquet file
+    """
+    # Excel columns often mix types (and updated date columns mix strings
+    # with timestamps), which Arrow cannot store in one column
+    mixed = {col: "string" for col in df.columns[df.dtypes == object]}
+    df.astype(mixed).to_parquet(output, engine="pyarrow", compression="zstd", index=False)
+
+# Output format -> (writer, file extension, MIME type)
+OUTPUT_FORMATS = {
+    "Parquet": (write_parquet, "parquet", "application/vnd.apache.parquet"),
+    "CSV": (write_csv, "csv", "text/csv"),
+    "XLSX": (write_xlsx, "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+def file_download(df, writer):
+    """
+    Return a callable that builds the output file only when it is downloaded
+    """
+    def build():
+        # Write to a temporary file rather than an in-memory buffer so only
+        # the finished file is held in RAM, and only on click
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "updated_file")
+            writer(df, path)
+            with open(path, "rb") as f:
+                return f.read()
+    return build
 
 def main():
     st.title("Excel Data Updater")
@@ -65,15 +209,17 @@ def main():
     
     if uploaded_file is not None:
         try:
-            df = pd.read_excel(uploaded_file)
+            file_bytes = uploaded_file.getvalue()
+            file_key = file_cache_key(file_bytes)
+            preview_df = preview_workbook(file_key, file_bytes)
             st.success("File successfully loaded!")
             
             # Display preview
             st.subheader("File Preview")
-            st.write(df.head())
+            st.write(preview_df)
             
             # Get column names
-            columns = df.columns.tolist()
+            columns = preview_df.columns.tolist()
             
             # User inputs
             st.subheader("Update Parameters")
@@ -90,19 +236,25 @@ def main():
             # Code input
             st.write("Paste codes (one per line or separated by commas):")
             codes_input = st.text_area("Codes", height=150)
+
+            # Parquet and CSV are much faster to produce than xlsx
+            output_format = st.radio("Output format", list(OUTPUT_FORMATS), horizontal=True)
             
             if st.button("Update Data"):
                 if not codes_input:
                     st.warning("Please enter at least one code.")
                 else:
                     # Parse codes (split by newline or comma)
-                    codes = re.split(r'[\n,]', codes_input)
+                    codes = _CODE_SPLIT_RE.split(codes_input)
                     codes = [code.strip() for code in codes if code.strip()]
                     
-                    # Update the dataframe
-                    updated_df, updated_rows = update_excel(
-                        df.copy(), codes, date_value, transmittal_value,
-                        date_col, transmittal_col, code_col
+                    # Update the dataframe; load_workbook hands out a fresh copy
+                    # on every rerun, so it is safe to mutate it in place
+                    df = load_workbook(file_key, file_bytes, code_col)
+                    updated_df, updated_rows, rows = update_excel(
+                        df, codes, date_value, transmittal_value,
+                        date_col, transmittal_col,
+                        code_index(file_key, file_bytes, code_col)
                     )
                     
                     if updated_rows > 0:
@@ -110,27 +262,30 @@ def main():
                         
                         # Show updated rows
                         st.subheader("Updated Rows Preview")
-                        # Find which rows were changed
-                        mask = (updated_df[date_col] == date_value.strftime("%d-%b-%y")) & (updated_df[transmittal_col] == transmittal_value)
-                        st.write(updated_df[mask].head())
-                        
-                        # Generate and display charts
-                        st.subheader("Document Status Visualizations")
-                        plot_status_charts(updated_df, date_col, transmittal_col, updated_rows)
-                        st.image('status_pie_chart.png', caption='Updated vs Non-Updated Rows')
-                        st.image('date_bar_chart.png', caption='Updates by Date')
-                        
-                        # Download button for CSV
-                        output = StringIO()
-                        updated_df.to_csv(output, index=False, date_format="%d-%b-%y")
-                        output.seek(0)
-                        
+                        # Rows are in code order; show the first few in file order
+                        st.write(updated_df.iloc[np.sort(rows)[:5]])
+
+                        # Download button for the chosen format
+                        writer, extension, mime = OUTPUT_FORMATS[output_format]
                         st.download_button(
-                            label="Download Updated CSV File",
-                            data=output.getvalue(),
-                            file_name="updated_file.csv",
-                            mime="text/csv"
+                            label=f"Download Updated {output_format} File",
+                            data=file_download(updated_df, writer),
+                            file_name=f"updated_file.{extension}",
+                            mime=mime,
+                            on_click="ignore"
                         )
+
+                        # Generate and display charts
+                        st.subheader("Document Status Visualizations")
+                        st.plotly_chart(px.pie(
+                            values=[updated_rows, len(updated_df) - updated_rows],
+                            names=['Updated Rows', 'Non-Updated Rows'],
+                            title='Document Update Status',
+                            color_discrete_sequence=['#66b3ff', '#ff9999']
+                        ))
+                        st.write("Number of Updates by Date")
+                        # sort=False keeps date order instead of sorting the labels as text
+                        st.bar_chart(date_counts(updated_df[date_col]), sort=False)
                     else:
                         st.warning("No matching codes found in the specified column.")
             